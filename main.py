@@ -1,16 +1,81 @@
+import asyncio
+import logging
 import os
+import time
+from contextlib import asynccontextmanager
 from typing import List, Optional
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
-from random import randint, choice, sample
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+import orjson
+from random import Random, randint, choice, choices, sample
 from datetime import datetime, timedelta, timezone
 
-from database import db, create_document, get_documents
+from database import db as sync_db, database_url, database_name, create_async_client, create_document, create_documents, get_documents
 from schemas import User, Character, Post, Story, Reel, Comment, Conversation, Message, Notification
 
-app = FastAPI(title="AIgram Backend")
+logger = logging.getLogger(__name__)
+
+
+def _default(o):
+    """orjson fallback for ObjectId (datetime is serialized natively by orjson)"""
+    if isinstance(o, ObjectId):
+        return str(o)
+    raise TypeError
+
+
+class MongoJSONResponse(ORJSONResponse):
+    """ORJSONResponse that understands ObjectId, so raw documents can be returned as-is"""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+# Seeded documents share a created_at per batch, so _id breaks ties for a stable order
+NEWEST_FIRST = [("created_at", -1), ("_id", -1)]
+
+
+async def ensure_indexes(db):
+    """Create the indexes the feed queries rely on (no-op when they already exist)"""
+    await db["post"].create_index(NEWEST_FIRST)
+    await db["story"].create_index(NEWEST_FIRST)
+    await db["post"].create_index([("author_id", 1)])
+    await db["comment"].create_index([("post_id", 1)])
+    # Lets concurrent bootstraps race safely: the server rejects duplicate characters
+    try:
+        await db["character"].create_index("username", unique=True)
+    except DuplicateKeyError as e:
+        logger.warning("character.username has duplicates; unique index not created: %s", e)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open and warm the pool before uvicorn starts accepting requests
+    client = create_async_client()
+    app.state.db = None
+    if client is not None:
+        app.state.db = client[database_name]
+        # Still start if Mongo is down or misconfigured; /test reports the error
+        try:
+            await asyncio.wait_for(client.admin.command("ping"), timeout=5)
+            await ensure_indexes(app.state.db)
+        except Exception as e:
+            logger.warning("MongoDB not ready at startup: %s", e)
+    yield
+    if client is not None:
+        client.close()
+
+
+def get_db(request: Request):
+    return request.app.state.db
+
+
+app = FastAPI(title="AIgram Backend", default_response_class=MongoJSONResponse, lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -31,18 +96,19 @@ def _now():
     return datetime.now(timezone.utc)
 
 
+# Fixed seed for the bootstrap roster, so every bootstrap generates the same usernames
+BOOTSTRAP_SEED = 701
+
+
 def ensure_bootstrap(character_count: int = 24, posts_per_character: int = 2):
-    if db is None:
+    if sync_db is None:
         raise HTTPException(status_code=500, detail="Database not configured")
 
-    existing = db["character"].count_documents({})
-    created_chars = 0
-    created_posts = 0
-    created_stories = 0
+    existing = sync_db["character"].estimated_document_count()
 
     # If we've already bootstrapped a bit, don't recreate — return counts quickly
     if existing >= 5:
-        return BootstrapResponse(characters=existing, posts=db["post"].count_documents({}), stories=db["story"].count_documents({}))
+        return BootstrapResponse(characters=existing, posts=sync_db["post"].estimated_document_count(), stories=sync_db["story"].estimated_document_count())
 
     first_names = [
         "Ava","Liam","Noah","Mia","Zoe","Kai","Leo","Ivy","Nora","Mila","Aria","Ezra","Finn","Luna","Nova","Zara","Enzo","Atlas","Jade","Ada"
@@ -52,131 +118,208 @@ def ensure_bootstrap(character_count: int = 24, posts_per_character: int = 2):
         "travel","food","art","fitness","tech","gaming","fashion","music","photo","nature","design","books","coffee","pets","memes"
     ]
 
-    # Create characters (guard against duplicates by username)
-    for i in range(character_count):
-        name = f"{choice(first_names)} {choice(last_names)}"
-        username = (name.split()[0] + str(randint(100, 999))).lower()
-        if db["character"].count_documents({"username": username}) > 0:
+    _choice, _choices, _randint, _sample = choice, choices, randint, sample
+    moods = ["virtual", "creative", "digital", "urban", "cozy"]
+    captions = ['Sunset vibes', 'Daily snap', 'Weekend mood', 'New drop', 'Behind the scenes']
+    overlays = ["Out and about", "Work in progress", "New playlist", "Coffee time", None]
+
+    # Seed data is generated here, so models are built with model_construct (no validation)
+    # Create characters. The roster is deterministic, so racing bootstraps produce the
+    # same usernames and the unique index lets only one of them insert each character
+    roster = Random(BOOTSTRAP_SEED)
+    first_batch = roster.choices(first_names, k=character_count)
+    last_batch = roster.choices(last_names, k=character_count)
+    number_batch = [roster.randint(100, 999) for _ in range(character_count)]
+    mood_batch = _choices(moods, k=character_count)
+    usernames = [f"{first.lower()}{number}" for first, number in zip(first_batch, number_batch)]
+    # The lifespan may not have managed to create the unique index (e.g. Mongo was down at boot)
+    try:
+        sync_db["character"].create_index("username", unique=True)
+    except DuplicateKeyError as e:
+        logger.warning("character.username has duplicates; unique index not created: %s", e)
+    # Skip roster entries that already exist; the index handles concurrent inserts beyond this
+    taken = {
+        doc["username"]
+        for doc in sync_db["character"].find({"username": {"$in": usernames}}, {"username": 1})
+    }
+    characters = []
+    for first, last, username, mood in zip(first_batch, last_batch, usernames, mood_batch):
+        if username in taken:
             continue
-        char = Character(
+        taken.add(username)
+        characters.append(Character.model_construct(
             username=username,
-            name=name,
-            bio=" ".join(["Exploring", choice(["virtual", "creative", "digital", "urban", "cozy"]) ,"worlds 🌐"]),
-            avatar_url=f"https://i.pravatar.cc/150?img={randint(1,70)}",
-            interests=sample(interests_pool, k=randint(2,4)),
-            followers=randint(100,9000),
-            following=randint(50,900),
-        )
-        create_document("character", char)
-        created_chars += 1
+            name=f"{first} {last}",
+            bio=f"Exploring {mood} worlds 🌐",
+            avatar_url=f"https://i.pravatar.cc/150?img={_randint(1,70)}",
+            interests=_sample(interests_pool, k=_randint(2,4)),
+            followers=_randint(100,9000),
+            following=_randint(50,900),
+        ))
+    try:
+        character_ids = create_documents("character", characters) if characters else []
+    except BulkWriteError as e:
+        # A concurrent bootstrap already inserted some of the roster; seed posts only for ours
+        errors = e.details.get("writeErrors", [])
+        if any(err.get("code") != 11000 for err in errors):
+            raise
+        rejected = {err["index"] for err in errors}
+        characters = [c for i, c in enumerate(characters) if i not in rejected]
+        ours = [c.username for c in characters]
+        ids = {
+            doc["username"]: str(doc["_id"])
+            for doc in sync_db["character"].find({"username": {"$in": ours}}, {"username": 1})
+        }
+        character_ids = [ids[c.username] for c in characters]
 
     # Create posts and stories
-    characters = list(db["character"].find({}).limit(character_count))
-    for c in characters:
+    post_count = len(characters) * posts_per_character
+    caption_batch = iter(_choices(captions, k=post_count))
+    tag_batch = iter(_choices(interests_pool, k=post_count * 3))
+    expires_at = (_now() + timedelta(hours=24)).isoformat()
+    posts_batch = []
+    stories_batch = []
+    for c, author_id in zip(characters, character_ids):
+        # Denormalized so the feed can be served without joining characters
+        author = {"username": c.username, "name": c.name, "avatar_url": c.avatar_url}
         for _ in range(posts_per_character):
-            media_url = f"https://picsum.photos/seed/{c['username']}-{randint(1,9999)}/800/1000"
-            post = Post(
+            posts_batch.append(Post.model_construct(
                 author_type="character",
-                author_id=str(c.get("_id")),
+                author_id=author_id,
                 type="image",
-                media_url=media_url,
-                caption=f"{choice(['Sunset vibes', 'Daily snap', 'Weekend mood', 'New drop', 'Behind the scenes'])} #{choice(interests_pool)}",
-                hashtags=[choice(interests_pool), choice(interests_pool)],
-                like_count=randint(10, 5000),
-                comment_count=randint(0, 200)
-            )
-            create_document("post", post)
-            created_posts += 1
+                media_url=f"https://picsum.photos/seed/{c.username}-{_randint(1,9999)}/800/1000",
+                caption=f"{next(caption_batch)} #{next(tag_batch)}",
+                hashtags=[next(tag_batch), next(tag_batch)],
+                like_count=_randint(10, 5000),
+                comment_count=_randint(0, 200),
+                author=author,
+            ))
         # occasional story
-        if randint(0, 1) == 1:
-            story = Story(
+        if _randint(0, 1) == 1:
+            stories_batch.append(Story.model_construct(
                 author_type="character",
-                author_id=str(c.get("_id")),
-                media_url=f"https://picsum.photos/seed/story-{c['username']}/720/1280",
-                text_overlay=choice(["Out and about", "Work in progress", "New playlist", "Coffee time", None]),
-                expires_at=(_now() + timedelta(hours=24)).isoformat()
-            )
-            create_document("story", story)
-            created_stories += 1
+                author_id=author_id,
+                media_url=f"https://picsum.photos/seed/story-{c.username}/720/1280",
+                text_overlay=_choice(overlays),
+                expires_at=expires_at,
+                author=author,
+            ))
+    if posts_batch:
+        create_documents("post", posts_batch)
+    if stories_batch:
+        create_documents("story", stories_batch)
 
     return BootstrapResponse(
-        characters=db["character"].count_documents({}),
-        posts=db["post"].count_documents({}),
-        stories=db["story"].count_documents({}),
+        characters=sync_db["character"].estimated_document_count(),
+        posts=sync_db["post"].estimated_document_count(),
+        stories=sync_db["story"].estimated_document_count(),
     )
 
 
+_ROOT_BYTES = orjson.dumps({"message": "AIgram Backend Running"})
+
+
 @app.get("/")
-def read_root():
-    return {"message": "AIgram Backend Running"}
+async def read_root():
+    return Response(_ROOT_BYTES, media_type="application/json")
 
 
 @app.get("/api/bootstrap", response_model=BootstrapResponse)
-def api_bootstrap():
-    return ensure_bootstrap()
+async def api_bootstrap():
+    result = await run_in_threadpool(ensure_bootstrap)
+    return Response(result.model_dump_json(), media_type="application/json")
+
+
+# Character fields copied into a post/story `author`
+AUTHOR_PROJECTION = {"username": 1, "name": 1, "avatar_url": 1}
+
+
+async def _hydrate_missing_authors(db, docs: list) -> list:
+    """Fill `author` on documents written before the author snapshot existed"""
+    missing = [d for d in docs if d.get("author") is None and ObjectId.is_valid(d.get("author_id") or "")]
+    if not missing:
+        return docs
+    oids = list({ObjectId(d["author_id"]) for d in missing})
+    cursor = db["character"].find({"_id": {"$in": oids}}, AUTHOR_PROJECTION).batch_size(128)
+    char_map = {str(c.pop("_id")): c async for c in cursor}
+    for d in missing:
+        author = char_map.get(d["author_id"])
+        if author:
+            d["author"] = author
+    return docs
 
 
 @app.get("/api/feed")
-def get_feed(limit: int = 25):
+async def get_feed(limit: int = Query(25, ge=1, le=100), db=Depends(get_db)):
     try:
-        posts = list(db["post"].find({}).sort("created_at", -1).limit(limit))
-        # hydrate with author basic info
-        char_map = {str(c.get("_id")): c for c in db["character"].find({})}
-        for p in posts:
-            aid = p.get("author_id")
-            c = char_map.get(aid)
-            if c:
-                p["author"] = {
-                    "username": c.get("username"),
-                    "name": c.get("name"),
-                    "avatar_url": c.get("avatar_url"),
-                }
-        return jsonable_encoder(posts)
+        posts = await db["post"].find({}).sort(NEWEST_FIRST).limit(limit).to_list(limit)
+        await _hydrate_missing_authors(db, posts)
+        return MongoJSONResponse(posts)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/api/stories")
-def get_stories(limit: int = 20):
-    stories = list(db["story"].find({}).sort("created_at", -1).limit(limit))
-    char_map = {str(c.get("_id")): c for c in db["character"].find({})}
-    for s in stories:
-        c = char_map.get(s.get("author_id"))
-        if c:
-            s["author"] = {
-                "username": c.get("username"),
-                "name": c.get("name"),
-                "avatar_url": c.get("avatar_url"),
-            }
-    return jsonable_encoder(stories)
+async def get_stories(limit: int = Query(20, ge=1, le=100), db=Depends(get_db)):
+    stories = await db["story"].find({}).sort(NEWEST_FIRST).limit(limit).to_list(limit)
+    await _hydrate_missing_authors(db, stories)
+    return MongoJSONResponse(stories)
+
+
+@app.get("/api/home")
+async def get_home(
+    posts: int = Query(25, ge=1, le=100),
+    stories: int = Query(20, ge=1, le=100),
+    db=Depends(get_db),
+):
+    """Feed and stories for the home screen in a single aggregation round-trip."""
+    pipeline = [
+        {"$sort": {"created_at": -1, "_id": -1}},
+        {"$limit": posts},
+        {"$set": {"_kind": "post"}},
+        {"$unionWith": {"coll": "story", "pipeline": [
+            {"$sort": {"created_at": -1, "_id": -1}},
+            {"$limit": stories},
+            {"$set": {"_kind": "story"}},
+        ]}},
+        # Both branches above are index-backed; $facet only splits the page
+        {"$facet": {
+            "posts": [{"$match": {"_kind": "post"}}, {"$unset": "_kind"}],
+            "stories": [{"$match": {"_kind": "story"}}, {"$unset": "_kind"}],
+        }},
+    ]
+    home = (await db["post"].aggregate(pipeline).to_list(1))[0]
+    await _hydrate_missing_authors(db, home["posts"] + home["stories"])
+    return MongoJSONResponse(home)
 
 
 @app.get("/api/characters")
-def get_characters(limit: int = 50):
-    chars = list(db["character"].find({}).limit(limit))
-    return jsonable_encoder(chars)
+async def get_characters(limit: int = Query(50, ge=1, le=200), db=Depends(get_db)):
+    chars = await db["character"].find({}).limit(limit).to_list(limit)
+    return MongoJSONResponse(chars)
 
 
 @app.post("/api/like/{post_id}")
-def like_post(post_id: str):
-    from bson import ObjectId
-    try:
-        res = db["post"].update_one({"_id": ObjectId(post_id)}, {"$inc": {"like_count": 1}, "$set": {"updated_at": _now()}})
-        if res.modified_count == 0:
-            raise HTTPException(status_code=404, detail="Post not found")
-        post = db["post"].find_one({"_id": ObjectId(post_id)})
-        return jsonable_encoder(post)
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+async def like_post(post_id: str, db=Depends(get_db)):
+    if not ObjectId.is_valid(post_id):
+        raise HTTPException(status_code=400, detail="Invalid post id")
+    post = await db["post"].find_one_and_update(
+        {"_id": ObjectId(post_id)},
+        {"$inc": {"like_count": 1}, "$set": {"updated_at": _now()}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if post is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    return MongoJSONResponse(post)
 
 
 # ---- Profile Endpoints ----
 
 def ensure_user() -> dict:
     """Ensure a single human user exists and return it."""
-    if db is None:
+    if sync_db is None:
         raise HTTPException(status_code=500, detail="Database not configured")
-    user = db["user"].find_one({})
+    user = sync_db["user"].find_one({})
     if user:
         return user
     u = User(
@@ -186,15 +329,15 @@ def ensure_user() -> dict:
         avatar_url="https://i.pravatar.cc/150?img=5",
     )
     create_document("user", u)
-    return db["user"].find_one({})
+    return sync_db["user"].find_one({})
 
 
 @app.get("/api/me")
-def get_me():
+async def get_me(db=Depends(get_db)):
     """Return the human user profile with a small set of their posts (if any)."""
-    user = ensure_user()
-    posts = list(db["post"].find({"author_type": "user", "author_id": str(user.get("_id"))}).sort("created_at", -1).limit(30))
-    return jsonable_encoder({
+    user = await run_in_threadpool(ensure_user)
+    posts = await db["post"].find({"author_type": "user", "author_id": str(user.get("_id"))}).sort(NEWEST_FIRST).limit(30).to_list(30)
+    return MongoJSONResponse({
         "user": user,
         "posts": posts,
         "stats": {
@@ -206,21 +349,21 @@ def get_me():
 
 
 @app.get("/api/user/{username}")
-def get_user_or_character(username: str):
+async def get_user_or_character(username: str, db=Depends(get_db)):
     """Return profile info and posts for a given username (user or character)."""
     # Look in user
-    entity = db["user"].find_one({"username": username})
+    entity = await db["user"].find_one({"username": username})
     entity_type = "user"
     if entity is None:
-        entity = db["character"].find_one({"username": username})
+        entity = await db["character"].find_one({"username": username})
         entity_type = "character"
     if entity is None:
         raise HTTPException(status_code=404, detail="Profile not found")
 
-    posts = list(db["post"].find({
+    posts = await db["post"].find({
         "author_type": entity_type,
         "author_id": str(entity.get("_id"))
-    }).sort("created_at", -1).limit(60))
+    }).sort(NEWEST_FIRST).limit(60).to_list(60)
 
     # hydrate author reference on posts for frontend reuse
     for p in posts:
@@ -236,7 +379,7 @@ def get_user_or_character(username: str):
         "following": entity.get("following", 250) if entity_type == "character" else 180,
     }
 
-    return jsonable_encoder({
+    return MongoJSONResponse({
         "type": entity_type,
         "profile": entity,
         "posts": posts,
@@ -244,8 +387,24 @@ def get_user_or_character(username: str):
     })
 
 
+# Environment doesn't change while the process runs; collection names are refreshed every 30s
+_DATABASE_URL_STATUS = "✅ Set" if database_url else "❌ Not Set"
+_DATABASE_NAME_STATUS = "✅ Set" if database_name else "❌ Not Set"
+_COLLECTIONS_TTL = 30
+_collections_cache = (0.0, None)
+
+
+async def _list_collections(db) -> list:
+    global _collections_cache
+    expires, names = _collections_cache
+    if names is None or time.monotonic() >= expires:
+        names = (await db.list_collection_names())[:10]
+        _collections_cache = (time.monotonic() + _COLLECTIONS_TTL, names)
+    return names
+
+
 @app.get("/test")
-def test_database():
+async def test_database(db=Depends(get_db)):
     response = {
         "backend": "✅ Running",
         "database": "❌ Not Available",
@@ -261,8 +420,7 @@ def test_database():
             response["database_name"] = db.name if hasattr(db, 'name') else "✅ Connected"
             response["connection_status"] = "Connected"
             try:
-                collections = db.list_collection_names()
-                response["collections"] = collections[:10]
+                response["collections"] = await _list_collections(db)
                 response["database"] = "✅ Connected & Working"
             except Exception as e:
                 response["database"] = f"⚠️  Connected but Error: {str(e)[:50]}"
@@ -271,12 +429,19 @@ def test_database():
     except Exception as e:
         response["database"] = f"❌ Error: {str(e)[:50]}"
 
-    response["database_url"] = "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set"
-    response["database_name"] = "✅ Set" if os.getenv("DATABASE_NAME") else "❌ Not Set"
+    response["database_url"] = _DATABASE_URL_STATUS
+    response["database_name"] = _DATABASE_NAME_STATUS
     return response
 
 
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=port,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", "2")),
+    )
@@ -15,7 +15,7 @@ Collections used:
 - Notification: Basic engagement notifications
 """
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional, Literal
 
 class User(BaseModel):
@@ -25,6 +25,8 @@ class User(BaseModel):
     avatar_url: Optional[str] = Field(None, description="Profile picture URL")
 
 class Character(BaseModel):
+    model_config = ConfigDict(extra='ignore', frozen=True)
+
     username: str = Field(..., description="Unique handle for the AI character")
     name: str = Field(..., description="Display name")
     bio: Optional[str] = Field(None, description="Short bio")
@@ -36,6 +38,8 @@ class Character(BaseModel):
 PostType = Literal["image", "video"]
 
 class Post(BaseModel):
+    model_config = ConfigDict(extra='ignore', frozen=True)
+
     author_type: Literal["character", "user"] = Field("character")
     author_id: str = Field(..., description="ID of the author document")
     type: PostType = Field("image")
@@ -44,13 +48,17 @@ class Post(BaseModel):
     hashtags: List[str] = Field(default_factory=list)
     like_count: int = Field(0, ge=0)
     comment_count: int = Field(0, ge=0)
+    author: Optional[dict] = Field(None, description="Snapshot of the author's username, name and avatar_url")
 
 class Story(BaseModel):
+    model_config = ConfigDict(extra='ignore', frozen=True)
+
     author_type: Literal["character", "user"] = Field("character")
     author_id: str
     media_url: str
     text_overlay: Optional[str] = None
     expires_at: Optional[str] = Field(None, description="ISO timestamp when the story expires")
+    author: Optional[dict] = Field(None, description="Snapshot of the author's username, name and avatar_url")
 
 class Reel(BaseModel):
     author_type: Literal["character", "user"] = Field("character")